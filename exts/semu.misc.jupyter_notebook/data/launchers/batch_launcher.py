@@ -0,0 +1,312 @@
+from typing import Any, Dict, List, Optional
+
+import os
+import sys
+import json
+import glob
+import time
+import socket
+import asyncio
+import argparse
+
+# load packages.txt and provisioners paths and the custom kernel spec manager
+from jupyter_launcher import SCRIPT_DIR, KernelSpecManager
+
+import nbformat
+from nbclient import NotebookClient
+from nbclient.exceptions import CellExecutionError
+from jupyter_client.manager import AsyncKernelManager
+
+
+SOCKET_HOST = "127.0.0.1"
+KERNEL_NAME = "embedded_omniverse_python3_socket"
+SOCKET_PORT_ENV = "SEMU_JUPYTER_NOTEBOOK_SOCKET_PORT"
+
+
+def _parse_parameter_value(value: str) -> Any:
+    """Parse a command line parameter value as JSON, falling back to a plain string
+    """
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+def _collect_notebooks(paths: List[str]) -> List[str]:
+    """Expand files and directories into a sorted list of notebook paths (checkpoints are ignored)
+    """
+    notebooks = []
+    for path in paths:
+        if os.path.isdir(path):
+            for notebook in sorted(glob.glob(os.path.join(path, "**", "*.ipynb"), recursive=True)):
+                if ".ipynb_checkpoints" not in notebook:
+                    notebooks.append(os.path.abspath(notebook))
+        elif os.path.isfile(path):
+            notebooks.append(os.path.abspath(path))
+        else:
+            print("Notebook not found: {}".format(path))
+    return notebooks
+
+def inject_parameters(notebook: nbformat.NotebookNode, parameters: Dict[str, Any]) -> None:
+    """Inject parameters into a notebook (papermill-style)
+
+    The injected cell is inserted after the cell tagged ``parameters``, or at the top of the notebook
+    if no cell is tagged. A previously injected cell (tagged ``injected-parameters``) is replaced
+
+    :param notebook: notebook to modify in-place
+    :type notebook: nbformat.NotebookNode
+    :param parameters: parameter names and values
+    :type parameters: dict
+    """
+    if not parameters:
+        return
+    source = "# Parameters\n" + "".join(["{} = {!r}\n".format(k, v) for k, v in parameters.items()])
+    cell = nbformat.v4.new_code_cell(source=source)
+    cell.metadata["tags"] = ["injected-parameters"]
+
+    notebook.cells = [c for c in notebook.cells if "injected-parameters" not in c.metadata.get("tags", [])]
+    index = 0
+    for i, c in enumerate(notebook.cells):
+        if "parameters" in c.metadata.get("tags", []):
+            index = i + 1
+            break
+    notebook.cells.insert(index, cell)
+
+
+async def _reset_namespace(socket_port: int) -> None:
+    """Delete the variables of the Kit execution namespace (%reset magic command)
+
+    :raises RuntimeError: if the namespace could not be reset
+    """
+    reader, writer = await asyncio.open_connection(host=SOCKET_HOST, port=socket_port, family=socket.AF_INET)
+    writer.write("%!m%reset".encode())
+    await writer.drain()
+    reply = json.loads((await reader.read()).decode())
+    writer.close()
+    await writer.wait_closed()
+    if reply.get("status") != "ok":
+        raise RuntimeError("Unable to reset the Kit namespace: {}".format(reply.get("evalue")))
+
+
+class _TimedNotebookClient(NotebookClient):
+    def __init__(self, *args, **kwargs) -> None:
+        """Notebook client that records the wall-clock execution time of each cell
+        """
+        super().__init__(*args, **kwargs)
+        self.timings = {}
+
+    async def async_execute_cell(self, cell, cell_index, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super().async_execute_cell(cell, cell_index, *args, **kwargs)
+        finally:
+            self.timings[cell_index] = time.perf_counter() - start
+
+
+async def execute_notebook(input_path: str,
+                           output_path: str,
+                           socket_port: int,
+                           parameters: Optional[Dict[str, Any]] = None,
+                           timeout: Optional[int] = None,
+                           allow_errors: bool = False,
+                           reset_namespace: bool = True) -> dict:
+    """Execute a notebook against the Omniverse Kit socket server listening at the given port
+
+    The executed notebook is written to ``output_path`` and the timing report next to it (``.timing.json``).
+    Errors (including unreadable notebooks) are recorded in the report instead of being raised
+
+    :param input_path: path of the notebook to execute
+    :type input_path: str
+    :param output_path: path where the executed notebook will be written
+    :type output_path: str
+    :param socket_port: port of the Kit socket server (``socket_port`` extension setting)
+    :type socket_port: int
+    :param parameters: parameters to inject into the notebook (default: None)
+    :type parameters: dict, optional
+    :param timeout: maximum execution time per cell in seconds, None for no limit (default: None)
+    :type timeout: int, optional
+    :param allow_errors: whether to continue the execution after a cell raises an error (default: False)
+    :type allow_errors: bool, optional
+    :param reset_namespace: whether to delete the variables of the Kit execution namespace (shared by all the
+                            notebooks executed in the same Kit instance) before executing the notebook (default: True)
+    :type reset_namespace: bool, optional
+
+    :return: timing report
+    :rtype: dict
+    """
+    notebook, client = None, None
+    status, error = "ok", None
+    start = time.perf_counter()
+    try:
+        notebook = nbformat.read(input_path, as_version=4)
+        inject_parameters(notebook, parameters)
+        if reset_namespace:
+            await _reset_namespace(socket_port)
+
+        km = AsyncKernelManager(kernel_name=KERNEL_NAME, kernel_spec_manager=KernelSpecManager())
+        client = _TimedNotebookClient(notebook,
+                                      km=km,
+                                      kernel_name=KERNEL_NAME,
+                                      timeout=timeout,
+                                      allow_errors=allow_errors,
+                                      resources={"metadata": {"path": os.path.dirname(input_path)}})
+        await client.async_execute(env={**os.environ, SOCKET_PORT_ENV: str(socket_port)})
+    except CellExecutionError as e:
+        status, error = "error", str(e)
+    except Exception as e:
+        status, error = "error", "{}: {}".format(type(e).__name__, e)
+    elapsed = time.perf_counter() - start
+
+    # write the executed notebook, even if it failed
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    if notebook is not None:
+        nbformat.write(notebook, output_path)
+
+    # build and write the timing report
+    cells = []
+    for index, duration in sorted(client.timings.items() if client is not None else []):
+        cell = notebook.cells[index]
+        failed = any([output.get("output_type") == "error" for output in cell.get("outputs", [])])
+        cells.append({"index": index,
+                      "id": cell.get("id"),
+                      "execution_count": cell.get("execution_count"),
+                      "status": "error" if failed else "ok",
+                      "duration": duration})
+    report = {"notebook": input_path,
+              "output": output_path,
+              "socket_port": socket_port,
+              "status": status,
+              "error": error,
+              "duration": elapsed,
+              "cells": cells}
+    with open(os.path.splitext(output_path)[0] + ".timing.json", "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+async def run_batch(notebooks: List[str],
+                    socket_ports: List[int],
+                    output_dir: str,
+                    parameters: Optional[Dict[str, Any]] = None,
+                    timeout: Optional[int] = None,
+                    allow_errors: bool = False,
+                    reset_namespace: bool = True) -> dict:
+    """Execute notebooks in parallel across the available Omniverse Kit instances
+
+    Each Kit instance executes one notebook at a time (the instance's namespace and event loop are shared),
+    so the throughput scales with the number of Kit instances. The namespace is reset between notebooks
+    (unless ``reset_namespace`` is False), so that the state of a notebook doesn't leak into the next one
+
+    :param notebooks: paths of the notebooks to execute
+    :type notebooks: list of str
+    :param socket_ports: ports of the Kit socket servers
+    :type socket_ports: list of int
+    :param output_dir: directory where the executed notebooks and reports will be written
+    :type output_dir: str
+    :param parameters: parameters to inject into each notebook (default: None)
+    :type parameters: dict, optional
+    :param timeout: maximum execution time per cell in seconds, None for no limit (default: None)
+    :type timeout: int, optional
+    :param allow_errors: whether to continue the execution after a cell raises an error (default: False)
+    :type allow_errors: bool, optional
+    :param reset_namespace: whether to delete the variables of the Kit execution namespace before each notebook (default: True)
+    :type reset_namespace: bool, optional
+
+    :return: batch report
+    :rtype: dict
+    """
+    # keep the notebooks' relative layout in the output directory
+    root = os.path.commonpath([os.path.dirname(notebook) for notebook in notebooks])
+    queue = asyncio.Queue()
+    for notebook in notebooks:
+        queue.put_nowait(notebook)
+
+    reports = []
+
+    async def worker(socket_port: int) -> None:
+        while True:
+            try:
+                notebook = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            output_path = os.path.join(output_dir, os.path.relpath(notebook, root))
+            print("[{}] Executing {}".format(socket_port, notebook))
+            try:
+                report = await execute_notebook(notebook, output_path, socket_port, parameters, timeout,
+                                                allow_errors, reset_namespace)
+            except Exception as e:
+                report = {"notebook": notebook,
+                          "output": output_path,
+                          "socket_port": socket_port,
+                          "status": "error",
+                          "error": "{}: {}".format(type(e).__name__, e),
+                          "duration": 0.0,
+                          "cells": []}
+            print("[{}] {} ({:.3f} s): {}".format(socket_port, report["status"], report["duration"], notebook))
+            reports.append(report)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker(port) for port in socket_ports])
+    elapsed = time.perf_counter() - start
+
+    report = {"socket_ports": socket_ports,
+              "notebooks": len(notebooks),
+              "failed": len([r for r in reports if r["status"] != "ok"]),
+              "duration": elapsed,
+              "throughput": len(notebooks) / elapsed if elapsed else 0.0,
+              "reports": sorted(reports, key=lambda r: r["notebook"])}
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, "batch_report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Execute notebooks non-interactively in Omniverse Kit instances")
+    parser.add_argument("notebooks", nargs="+", help="notebook files or directories (searched recursively)")
+    parser.add_argument("-o", "--output-dir", default=os.path.join(os.getcwd(), "executed"),
+                        help="directory for the executed notebooks and reports (default: ./executed)")
+    parser.add_argument("-s", "--socket-ports", default="",
+                        help="comma-separated ports of the Kit socket servers (default: port in socket.txt)")
+    parser.add_argument("-p", "--parameter", nargs=2, action="append", default=[], metavar=("NAME", "VALUE"),
+                        help="parameter to inject (value is parsed as JSON, falling back to a string)")
+    parser.add_argument("-f", "--parameters-file", default="", help="JSON file with the parameters to inject")
+    parser.add_argument("--timeout", type=int, default=None, help="maximum execution time per cell in seconds")
+    parser.add_argument("--allow-errors", action="store_true", help="continue the execution after cell errors")
+    parser.add_argument("--no-reset", action="store_true",
+                        help="don't reset the Kit execution namespace between notebooks (state is shared)")
+    args = parser.parse_args()
+
+    # socket ports
+    if args.socket_ports:
+        socket_ports = [int(port) for port in args.socket_ports.split(",") if port.strip()]
+    else:
+        with open(os.path.join(SCRIPT_DIR, "socket.txt"), "r") as f:
+            socket_ports = [int(f.read())]
+
+    # parameters
+    parameters = {}
+    if args.parameters_file:
+        with open(args.parameters_file, "r") as f:
+            parameters.update(json.load(f))
+    for name, value in args.parameter:
+        parameters[name] = _parse_parameter_value(value)
+
+    notebooks = _collect_notebooks(args.notebooks)
+    if not notebooks:
+        print("No notebooks to execute")
+        sys.exit(1)
+
+    print("Executing {} notebooks on {} Kit instance(s): {}".format(len(notebooks), len(socket_ports), socket_ports))
+    report = asyncio.run(run_batch(notebooks=notebooks,
+                                   socket_ports=socket_ports,
+                                   output_dir=os.path.abspath(args.output_dir),
+                                   parameters=parameters,
+                                   timeout=args.timeout,
+                                   allow_errors=args.allow_errors,
+                                   reset_namespace=not args.no_reset))
+    print("Executed {} notebooks ({} failed) in {:.3f} s ({:.3f} notebooks/s)" \
+        .format(report["notebooks"], report["failed"], report["duration"], report["throughput"]))
+
+    sys.exit(1 if report["failed"] else 0)
@@ -7,6 +7,12 @@ import asyncio
 
 SOCKET_HOST = "127.0.0.1"
 SOCKET_PORT = 8224
+SOCKET_PORT_ENV = "SEMU_JUPYTER_NOTEBOOK_SOCKET_PORT"
+EVENTS_COMM_TARGET = "semu.misc.jupyter_notebook.events"
+EVENTS_STREAM_LIMIT = 2 ** 26  # maximum size (in bytes) of an event batch
+VARIABLES_COMM_TARGET = "semu.misc.jupyter_notebook.variables"
+KIT_MAGICS = ["%reset", "%del", "%jobs"]  # line magics executed in Omniverse Kit
+KIT_CELL_MAGICS = ["%%background"]  # cell magics executed in Omniverse Kit
 PACKAGES_PATH = []
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -21,6 +27,7 @@ with open(os.path.join(SCRIPT_DIR, "packages.txt"), "r") as f:
                 sys.path.append(p)
 
 
+from ipykernel.comm import CommManager
 from ipykernel.kernelbase import Kernel
 from ipykernel.kernelapp import IPKernelApp
 
@@ -29,10 +36,13 @@ async def _send_and_recv(message):
     reader, writer = await asyncio.open_connection(host=SOCKET_HOST, 
                                                    port=SOCKET_PORT,
                                                    family=socket.AF_INET)
-    writer.write(message.encode())
-    await writer.drain()
-    data = await reader.read()
-    writer.close()
+    # close the connection even if the execution is interrupted (Omniverse Kit cancels the running execution)
+    try:
+        writer.write(message.encode())
+        await writer.drain()
+        data = await reader.read()
+    finally:
+        writer.close()
     await writer.wait_closed()
     return data.decode()
 
@@ -61,6 +71,18 @@ class EmbeddedKernel(Kernel):
     banner = "Embedded Omniverse (Python 3)"
     help_links = [{"text": "semu.misc.jupyter_notebook", "url": "https://github.com/Toni-SM/semu.misc.jupyter_notebook"}]
 
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # comms (https://jupyter-client.readthedocs.io/en/latest/messaging.html#custom-messages)
+        self._event_writers = {}
+        self._variables_comms = {}
+        self._job_writers = {}
+        self.comm_manager = CommManager(parent=self, kernel=self)
+        self.comm_manager.register_target(EVENTS_COMM_TARGET, self._open_events_comm)
+        self.comm_manager.register_target(VARIABLES_COMM_TARGET, self._open_variables_comm)
+        for msg_type in ["comm_open", "comm_msg", "comm_close"]:
+            self.shell_handlers[msg_type] = getattr(self.comm_manager, msg_type)
+
     async def do_execute(self, code, silent, store_history=True, user_expressions=None, allow_stdin=False):
         """Execute user code
         """
@@ -73,12 +95,15 @@ class EmbeddedKernel(Kernel):
         if not code.strip():
             return execute_reply
         # magic commands
+        message = code
         if code.startswith('%'):
-            # TODO: process magic commands
-            pass
+            if code.split()[0] in KIT_MAGICS and len(code.strip().splitlines()) == 1:
+                message = "%!m" + code.strip()
+            elif code.split()[0] in KIT_CELL_MAGICS:
+                message = "%!m" + code
         # python code
         try:
-            data = await _send_and_recv(code)
+            data = await _send_and_recv(message)
             reply_content = json.loads(data)
         except Exception as e:
             # show network error in client
@@ -88,12 +113,31 @@ class EmbeddedKernel(Kernel):
             print("\x1b[0;31m==================================================\x1b[0m")
             reply_content = {"status": "error", "output": "", "traceback": [], "ename": str(type(e).__name__), "evalue": str(e)}
 
-        # code execution stdout: {"status": str, "output": str}
+        # code execution stdout and stderr (including carb log messages): {"status": str, "output": str, "stderr": str}
         if not silent:
             if reply_content["output"]:
                 stream_content = {"name": "stdout", "text": reply_content["output"]}
                 self.send_response(self.iopub_socket, "stream", stream_content)
+            if reply_content.get("stderr"):
+                stream_content = {"name": "stderr", "text": reply_content["stderr"]}
+                self.send_response(self.iopub_socket, "stream", stream_content)
         reply_content.pop("output", None)
+        reply_content.pop("stderr", None)
+
+        # background job (%%background): display its state and update it as it is pushed by Omniverse Kit
+        job = reply_content.pop("job", None)
+        if job is not None and not silent:
+            display_id = "semu.misc.jupyter_notebook.job.{}".format(job["id"])
+            self.send_response(self.iopub_socket, "display_data", {"data": {"text/plain": job["repr"]},
+                                                                   "metadata": {},
+                                                                   "transient": {"display_id": display_id}})
+            asyncio.ensure_future(self._watch_job(job["id"], display_id))
+
+        # namespace changes: {"version": int, "base": int, "changed": list(dict), "removed": list(str)}
+        variables = reply_content.pop("variables", None)
+        if variables is not None:
+            for comm in list(self._variables_comms.values()):
+                comm.send({"action": "diff", **variables})
 
         # code execution error: {"status": str("error"), "output": str, "traceback": list(str), "ename": str, "evalue": str}
         if reply_content["status"] == "error":
@@ -101,13 +145,129 @@ class EmbeddedKernel(Kernel):
 
         # update reply
         execute_reply["status"] = reply_content["status"]
-        execute_reply["execution_count"] = self.execution_count,  # the base class increments the execution count
+        execute_reply["execution_count"] = self.execution_count  # the base class increments the execution count
+        if reply_content["status"] == "error":
+            execute_reply["traceback"] = reply_content["traceback"]
+            execute_reply["ename"] = reply_content["ename"]
+            execute_reply["evalue"] = reply_content["evalue"]
 
         return execute_reply
 
     def do_debug_request(self, msg):
         return {}
 
+    def do_shutdown(self, restart):
+        """Close the event stream connections (Omniverse Kit unsubscribes from the streams)
+        """
+        for writer in list(self._event_writers.values()) + list(self._job_writers.values()):
+            writer.close()
+        self._event_writers = {}
+        self._job_writers = {}
+        return super().do_shutdown(restart)
+
+    def _open_events_comm(self, comm, msg):
+        """Forward the event batches of an Omniverse Kit event stream to the comm opened by the client
+
+        The comm_open data holds the subscription options, e.g.: {"stream": "update", "rate": 10, "policy": "sample"}.
+        Comm messages sent by the client update the subscription options. Closing the comm unsubscribes
+        """
+        asyncio.ensure_future(self._forward_events(comm, msg["content"]["data"]))
+
+    def _open_variables_comm(self, comm, msg):
+        """Variable explorer API for the comm opened by the client
+
+        The current variables are sent when the comm is opened ({"action": "list", "version": int, "variables": list})
+        and the changes after each execution ({"action": "diff", "version": int, "base": int, "changed": list, "removed": list}).
+        The client can request the list ({"action": "list"}) and the deep size of some variables
+        ({"action": "size", "names": list}), replied as {"action": "size", "sizes": dict}
+        """
+        def on_msg(msg):
+            asyncio.ensure_future(self._send_variables(comm, msg["content"]["data"]))
+
+        def on_close(msg):
+            self._variables_comms.pop(comm.comm_id, None)
+
+        self._variables_comms[comm.comm_id] = comm
+        comm.on_msg(on_msg)
+        comm.on_close(on_close)
+        asyncio.ensure_future(self._send_variables(comm, {"action": "list"}))
+
+    async def _send_variables(self, comm, request):
+        try:
+            data = await _send_and_recv("%!v" + json.dumps(request))
+            reply_content = json.loads(data)
+        except Exception as e:
+            reply_content = {"action": request.get("action"), "error": "{}: {}".format(type(e).__name__, e)}
+        comm.send(reply_content)
+
+    async def _forward_events(self, comm, options):
+        try:
+            reader, writer = await asyncio.open_connection(host=SOCKET_HOST,
+                                                           port=SOCKET_PORT,
+                                                           family=socket.AF_INET,
+                                                           limit=EVENTS_STREAM_LIMIT)
+        except Exception as e:
+            comm.send({"error": "{}: {}".format(type(e).__name__, e)})
+            comm.close()
+            return
+        self._event_writers[comm.comm_id] = writer
+
+        def on_msg(msg):
+            writer.write((json.dumps(msg["content"]["data"]) + "\n").encode())
+
+        def on_close(msg):
+            self._event_writers.pop(comm.comm_id, None)
+            writer.close()
+
+        comm.on_msg(on_msg)
+        comm.on_close(on_close)
+
+        # subscribe and forward the event batches: {"stream": str, "events": list, "dropped": int} or {"error": str}
+        writer.write(("%!s" + json.dumps(options) + "\n").encode())
+        while True:
+            try:
+                line = await reader.readline()
+            except Exception:
+                break
+            if not line:
+                break
+            comm.send(json.loads(line))
+
+        # connection closed by Omniverse Kit
+        if self._event_writers.pop(comm.comm_id, None) is not None:
+            writer.close()
+            comm.close()
+
+    async def _watch_job(self, job_id, display_id):
+        """Update the display of a background job with the updates pushed by Omniverse Kit until the job finishes
+        """
+        try:
+            reader, writer = await asyncio.open_connection(host=SOCKET_HOST,
+                                                           port=SOCKET_PORT,
+                                                           family=socket.AF_INET)
+        except Exception:
+            return
+        self._job_writers[display_id] = writer
+
+        # job updates: {"id": int, "name": str, "status": str, "progress": float, "message": str, "repr": str} or {"error": str}
+        writer.write("%!j{}".format(job_id).encode())
+        while True:
+            try:
+                line = await reader.readline()
+            except Exception:
+                break
+            if not line:
+                break
+            update = json.loads(line)
+            if "repr" in update:
+                self.send_response(self.iopub_socket, "update_display_data", {"data": {"text/plain": update["repr"]},
+                                                                              "metadata": {},
+                                                                              "transient": {"display_id": display_id}})
+
+        # connection closed by Omniverse Kit (the job finished)
+        if self._job_writers.pop(display_id, None) is not None:
+            writer.close()
+
     async def do_complete(self, code, cursor_pos):
         """Code completation
         """
@@ -135,9 +295,11 @@ class EmbeddedKernel(Kernel):
             print("\x1b[0;31m==================================================\x1b[0m")
             reply_content = {"matches": [], "delta": cursor_pos}
 
-        # update replay: {"matches": list(str), "delta": int}
+        # update replay: {"matches": list(str), "delta": int, "more_available": bool, "metadata": dict}
         complete_reply["matches"] = reply_content["matches"]
         complete_reply["cursor_start"] = cursor_pos - reply_content["delta"]
+        complete_reply["metadata"] = reply_content.get("metadata", {})
+        complete_reply["metadata"]["more_available"] = reply_content.get("more_available", False)
 
         return complete_reply
 
@@ -182,5 +344,8 @@ if __name__ == "__main__":
     if os.path.exists(os.path.join(SCRIPT_DIR, "socket.txt")):
         with open(os.path.join(SCRIPT_DIR, "socket.txt"), "r") as f:
             SOCKET_PORT = int(f.read())
-    
+    # socket port can be overridden (e.g. by the batch launcher to target a specific Kit instance)
+    if os.environ.get(SOCKET_PORT_ENV):
+        SOCKET_PORT = int(os.environ[SOCKET_PORT_ENV])
+
     IPKernelApp.launch_instance(kernel_class=EmbeddedKernel)
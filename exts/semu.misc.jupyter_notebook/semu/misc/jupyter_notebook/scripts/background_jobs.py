@@ -0,0 +1,234 @@
+from typing import Any, Callable, List, Optional
+
+import asyncio
+import inspect
+import traceback
+import contextvars
+import collections
+
+from .output_capture import OutputCapture
+
+
+# job of the running task (each asyncio task has its own context)
+_current_job = contextvars.ContextVar("semu.misc.jupyter_notebook.job", default=None)
+
+
+def report_progress(value: Optional[float] = None, message: str = "") -> None:
+    """Report the progress of the running background job (it does nothing outside a background job)
+
+    The progress is pushed to the job's display in the notebook (see ``BackgroundJob.add_waiter``)
+
+    :param value: progress between 0 and 1 (default: None, unknown)
+    :type value: float, optional
+    :param message: progress message (default: "")
+    :type message: str, optional
+    """
+    job = _current_job.get()
+    if job is not None:
+        job.progress = value
+        job.message = message
+        job._notify()
+
+
+class BackgroundJob:
+    def __init__(self, job_id: int, name: str = "") -> None:
+        """Handle of a background job
+
+        :param job_id: job identifier
+        :type job_id: int
+        :param name: job name (default: "")
+        :type name: str, optional
+        """
+        self.id = job_id
+        self.name = name
+        self.progress = None
+        self.message = ""
+
+        self._status = "pending"
+        self._result = None
+        self._error = None
+        self._traceback = ""
+        self._capture = OutputCapture()
+        self._task = None
+        self._waiters = []
+
+    def __repr__(self) -> str:
+        progress = "" if self.progress is None else f" {100 * self.progress:.0f}%"
+        message = f" ({self.message})" if self.message else ""
+        name = f" {self.name}" if self.name else ""
+        return f"<BackgroundJob {self.id}{name}: {self._status}{progress}{message}>"
+
+    @property
+    def status(self) -> str:
+        """Job status: "pending", "running", "done", "error" or "cancelled"
+        """
+        return self._status
+
+    @property
+    def output(self) -> str:
+        """Output (stdout, and stderr and carb log messages) produced by the job so far
+        """
+        return self._capture.stdout.getvalue() + self._capture.stderr.getvalue()
+
+    @property
+    def traceback(self) -> str:
+        """Traceback of the error raised by the job, if any
+        """
+        return self._traceback
+
+    def as_dict(self) -> dict:
+        """Get the job state as a JSON serializable dictionary
+
+        :return: {"id": int, "name": str, "status": str, "progress": float or None, "message": str, "repr": str}
+        :rtype: dict
+        """
+        return {"id": self.id,
+                "name": self.name,
+                "status": self._status,
+                "progress": self.progress,
+                "message": self.message,
+                "repr": repr(self)}
+
+    def add_waiter(self) -> asyncio.Future:
+        """Get a future that is resolved on the next update of the job (status or progress change)
+
+        It must be called from the event loop in which the job runs
+        """
+        waiter = asyncio.get_event_loop().create_future()
+        self._waiters.append(waiter)
+        return waiter
+
+    def _notify(self) -> None:
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def done(self) -> bool:
+        """Whether the job has finished (done, error or cancelled)
+        """
+        return self._status in ["done", "error", "cancelled"]
+
+    def cancel(self) -> bool:
+        """Request the cancellation of the job
+
+        :return: False if the job has already finished, True otherwise
+        :rtype: bool
+        """
+        if self.done() or self._task is None:
+            return False
+        return self._task.cancel()
+
+    def result(self) -> Any:
+        """Get the result of the job (the value of the cell's last expression)
+
+        :raises RuntimeError: if the job has not finished yet
+        :raises asyncio.CancelledError: if the job was cancelled
+        :raises Exception: the error raised by the job, if any
+
+        :return: job result
+        :rtype: Any
+        """
+        if not self.done():
+            raise RuntimeError(f"Background job {self.id} has not finished yet ({self._status})")
+        if self._status == "cancelled":
+            raise asyncio.CancelledError()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    async def wait(self) -> Any:
+        """Wait for the job to finish and get its result (see ``result``)
+        """
+        if self._task is not None:
+            await asyncio.wait([self._task])
+        return self.result()
+
+
+class BackgroundJobManager:
+    def __init__(self, max_concurrency: int = 8, max_history: int = 100) -> None:
+        """Schedule and keep track of background jobs in the current event loop
+
+        :param max_concurrency: maximum number of jobs running at the same time (default: 8)
+        :type max_concurrency: int, optional
+        :param max_history: maximum number of finished jobs to keep (default: 100)
+        :type max_history: int, optional
+        """
+        self._max_concurrency = max(1, max_concurrency)
+        self._max_history = max_history
+        self._semaphore = None
+        self._jobs = collections.OrderedDict()
+        self._next_id = 1
+
+    @property
+    def jobs(self) -> List[BackgroundJob]:
+        """Tracked jobs (running, pending and the most recent finished ones)
+        """
+        return list(self._jobs.values())
+
+    def get(self, job_id: int) -> Optional[BackgroundJob]:
+        """Get a tracked job by its identifier
+        """
+        return self._jobs.get(job_id)
+
+    def submit(self, function: Callable[[], Any], name: str = "") -> BackgroundJob:
+        """Schedule a job in the current event loop
+
+        :param function: function to run. If it returns an awaitable, the awaitable is awaited
+        :type function: callable
+        :param name: job name (default: "")
+        :type name: str, optional
+
+        :return: job handle
+        :rtype: BackgroundJob
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        self._prune()
+
+        job = BackgroundJob(self._next_id, name)
+        self._next_id += 1
+        self._jobs[job.id] = job
+        job._task = asyncio.ensure_future(self._run(job, function))
+        # the final status is derived from the task (it may be cancelled before it starts running)
+        job._task.add_done_callback(lambda task: self._on_done(job, task))
+        return job
+
+    def cancel_all(self) -> None:
+        """Request the cancellation of all the unfinished jobs
+        """
+        for job in self._jobs.values():
+            job.cancel()
+
+    def _prune(self) -> None:
+        """Forget the oldest finished jobs beyond the history limit
+        """
+        finished = [job_id for job_id, job in self._jobs.items() if job.done()]
+        for job_id in finished[:max(0, len(finished) - self._max_history)]:
+            del self._jobs[job_id]
+
+    async def _run(self, job: BackgroundJob, function: Callable[[], Any]) -> Any:
+        async with self._semaphore:
+            job._status = "running"
+            job._notify()
+            _current_job.set(job)
+            with job._capture:
+                result = function()
+                if inspect.isawaitable(result):
+                    result = await result
+        return result
+
+    def _on_done(self, job: BackgroundJob, task: asyncio.Future) -> None:
+        """Set the final status of a job from its finished task
+        """
+        if task.cancelled():
+            job._status = "cancelled"
+        elif task.exception() is not None:
+            error = task.exception()
+            job._status = "error"
+            job._error = error
+            job._traceback = "".join(traceback.format_exception(type(error), error, error.__traceback__))
+        else:
+            job._status = "done"
+            job._result = task.result()
+        job._notify()
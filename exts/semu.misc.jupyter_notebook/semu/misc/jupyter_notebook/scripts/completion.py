@@ -0,0 +1,94 @@
+from typing import Any, Collection, List, Optional, Tuple
+
+import re
+import collections
+
+
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+def match_score(prefix: str, name: str) -> Optional[float]:
+    """Score how well a name matches the typed prefix
+
+    Exact prefix matches score 3, case-insensitive prefix matches 2.5 and
+    (case-insensitive) subsequence matches between 1 and 2, the more compact the higher
+
+    :param prefix: typed prefix
+    :type prefix: str
+    :param name: candidate name
+    :type name: str
+
+    :return: score or None if the name doesn't match the prefix
+    :rtype: float or None
+    """
+    if not prefix or name.startswith(prefix):
+        return 3.0
+    lower_prefix, lower_name = prefix.lower(), name.lower()
+    if lower_name.startswith(lower_prefix):
+        return 2.5
+    # subsequence
+    start, position = -1, -1
+    for char in lower_prefix:
+        position = lower_name.find(char, position + 1)
+        if position == -1:
+            return None
+        if start == -1:
+            start = position
+    return 1.0 + len(prefix) / (position - start + 1)
+
+
+class CompletionRanker:
+    def __init__(self, max_recent: int = 1000) -> None:
+        """Rank completions by match quality, boosting recently used names and user variables
+
+        :param max_recent: maximum number of recently used names to remember (default: 1000)
+        :type max_recent: int, optional
+        """
+        self._max_recent = max_recent
+        self._recent = collections.OrderedDict()
+
+    def record_usage(self, statement: str) -> None:
+        """Remember the names used in an executed statement (the most recent last)
+
+        :param statement: executed statement
+        :type statement: str
+        """
+        for name in _IDENTIFIER.findall(statement):
+            self._recent.pop(name, None)
+            self._recent[name] = True
+        while len(self._recent) > self._max_recent:
+            self._recent.popitem(last=False)
+
+    def rank(self, completions: List[Any], prefix: str, variables: Collection[str], limit: int) -> Tuple[List[Any], bool]:
+        """Filter and sort completions by relevance and keep the top ones
+
+        :param completions: completions (objects with a ``name`` attribute, e.g. jedi's Completion)
+        :type completions: list
+        :param prefix: typed prefix
+        :type prefix: str
+        :param variables: names of the user variables to boost (empty when completing attributes)
+        :type variables: collection of str
+        :param limit: maximum number of completions to keep. If 0, all are kept
+        :type limit: int
+
+        :return: top completions and whether more completions are available
+        :rtype: tuple of list and bool
+        """
+        recent = {name: i / len(self._recent) for i, name in enumerate(self._recent)} if self._recent else {}
+        scored = []
+        for completion in completions:
+            name = completion.name
+            score = match_score(prefix, name)
+            if score is None:
+                continue
+            score += 0.5 * recent.get(name, 0.0) + (0.5 if name in recent else 0.0)
+            if name in variables:
+                score += 0.25
+            if name.startswith("_") and not prefix.startswith("_"):
+                score -= 1.0 if name.startswith("__") else 0.5
+            scored.append((-score, len(name), name.lower(), completion))
+        scored.sort(key=lambda item: item[:3])
+        completions = [item[3] for item in scored]
+        if limit > 0 and len(completions) > limit:
+            return completions[:limit], True
+        return completions, False
@@ -0,0 +1,213 @@
+from typing import Any, Callable, List, Optional
+
+import json
+import time
+import random
+import asyncio
+import threading
+
+import carb
+import omni.kit.app
+
+
+def _subscribe_update(callback: Callable) -> Any:
+    return omni.kit.app.get_app().get_update_event_stream() \
+        .create_subscription_to_pop(callback, name="semu.misc.jupyter_notebook.events")
+
+def _subscribe_timeline(callback: Callable) -> Any:
+    import omni.timeline
+    return omni.timeline.get_timeline_interface().get_timeline_event_stream() \
+        .create_subscription_to_pop(callback, name="semu.misc.jupyter_notebook.events")
+
+def _subscribe_stage(callback: Callable) -> Any:
+    import omni.usd
+    return omni.usd.get_context().get_stage_event_stream() \
+        .create_subscription_to_pop(callback, name="semu.misc.jupyter_notebook.events")
+
+def _subscribe_physics(callback: Callable) -> Any:
+    import omni.physx
+    return omni.physx.acquire_physx_interface().subscribe_physics_step_events(callback)
+
+# event streams that can be forwarded to the notebook (name: function to subscribe a callback)
+STREAMS = {"update": _subscribe_update,
+           "timeline": _subscribe_timeline,
+           "stage": _subscribe_stage,
+           "physics": _subscribe_physics}
+
+POLICIES = ["drop", "sample"]
+
+# delay (in seconds) between flush retries while the client is not consuming the batches (backpressure)
+BACKPRESSURE_DELAY = 0.05
+
+
+def _serialize_event(event: Any) -> dict:
+    """Convert a Kit event (carb.events.IEvent or physics step time) to a JSON serializable dictionary
+    """
+    if isinstance(event, (int, float)):
+        return {"time": time.time(), "dt": event}
+    try:
+        payload = event.payload.get_dict()
+    except Exception:
+        payload = {}
+    return {"time": time.time(), "type": event.type, "sender": event.sender, "payload": payload}
+
+
+class EventSubscription:
+    def __init__(self,
+                 transport: asyncio.Transport,
+                 loop: asyncio.AbstractEventLoop,
+                 stream: str,
+                 rate: float = 10.0,
+                 max_batch: int = 1000,
+                 max_pending: int = 10000,
+                 policy: str = "drop",
+                 max_buffer_size: int = 1048576,
+                 types: Optional[List[int]] = None) -> None:
+        """Forward the events of a Kit event stream, coalesced into batches, through a socket transport
+
+        Batches are written as newline-delimited JSON: {"stream": str, "events": list, "dropped": int}.
+        Under backpressure (the transport's write buffer exceeds ``max_buffer_size``) events are kept pending.
+        Once ``max_pending`` events are pending, new events are discarded ("drop" policy) or
+        uniformly sampled using reservoir sampling ("sample" policy)
+
+        :param transport: transport to write the batches to
+        :type transport: asyncio.Transport
+        :param loop: event loop in which the transport lives
+        :type loop: asyncio.AbstractEventLoop
+        :param stream: event stream name (see STREAMS)
+        :type stream: str
+        :param rate: maximum number of batches per second. If 0, there is no rate limit (default: 10.0)
+        :type rate: float, optional
+        :param max_batch: maximum number of events per batch (default: 1000)
+        :type max_batch: int, optional
+        :param max_pending: maximum number of events pending to be sent (default: 10000)
+        :type max_pending: int, optional
+        :param policy: policy applied when ``max_pending`` is reached: "drop" or "sample" (default: "drop")
+        :type policy: str, optional
+        :param max_buffer_size: transport's write buffer size (in bytes) above which no batch is written (default: 1 MiB)
+        :type max_buffer_size: int, optional
+        :param types: event types to forward. If None, all events are forwarded (default: None)
+        :type types: list of int, optional
+
+        :raises ValueError: if the stream or the policy is not supported
+        """
+        if stream not in STREAMS:
+            raise ValueError(f"Unsupported event stream '{stream}'. Supported streams: {list(STREAMS.keys())}")
+        self._transport = transport
+        self._loop = loop
+        self._stream = stream
+
+        self._lock = threading.Lock()
+        self._pending = []
+        self._seen = 0
+        self._dropped = 0
+        self._last_flush = 0.0
+        self._flush_handle = None
+        self._closed = False
+
+        self.configure(rate=rate,
+                       max_batch=max_batch,
+                       max_pending=max_pending,
+                       policy=policy,
+                       max_buffer_size=max_buffer_size,
+                       types=types)
+        self._subscription = STREAMS[stream](self._on_event)
+        carb.log_info(f"Event stream subscription: {stream}")
+
+    def configure(self, **options) -> None:
+        """Update the subscription options (see the constructor for the available options)
+
+        :raises ValueError: if an option or the policy is not supported
+        """
+        for name, value in options.items():
+            if name not in ["rate", "max_batch", "max_pending", "policy", "max_buffer_size", "types"]:
+                raise ValueError(f"Unsupported option '{name}'")
+            if name == "policy" and value not in POLICIES:
+                raise ValueError(f"Unsupported policy '{value}'. Supported policies: {POLICIES}")
+        with self._lock:
+            if "rate" in options:
+                self._rate = float(options["rate"])
+            if "max_batch" in options:
+                self._max_batch = max(1, int(options["max_batch"]))
+            if "max_pending" in options:
+                self._max_pending = int(options["max_pending"])
+            if "policy" in options:
+                self._policy = options["policy"]
+            if "max_buffer_size" in options:
+                self._max_buffer_size = int(options["max_buffer_size"])
+            if "types" in options:
+                self._types = options["types"]
+            self._max_pending = max(self._max_batch, self._max_pending)
+
+    def close(self) -> None:
+        """Unsubscribe from the event stream and discard the pending events
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._subscription = None
+            self._pending = []
+            if isinstance(self._flush_handle, asyncio.TimerHandle):
+                self._flush_handle.cancel()
+            self._flush_handle = None
+        carb.log_info(f"Event stream unsubscription: {self._stream}")
+
+    def _on_event(self, event: Any) -> None:
+        """Event stream callback (it may be called from any thread)
+        """
+        if self._types is not None and getattr(event, "type", None) not in self._types:
+            return
+        # decide whether the event is kept before serializing it (shed events are not serialized)
+        with self._lock:
+            if self._closed:
+                return
+            self._seen += 1
+            if len(self._pending) < self._max_pending:
+                self._pending.append(_serialize_event(event))
+            else:
+                self._dropped += 1
+                if self._policy == "sample":
+                    index = random.randrange(self._seen)
+                    if index < self._max_pending:
+                        self._pending[index] = _serialize_event(event)
+            self._schedule_flush()
+
+    def _schedule_flush(self, min_delay: float = 0.0) -> None:
+        """Schedule a flush in the event loop, according to the rate limit (the lock must be held)
+        """
+        if self._flush_handle is not None or self._closed:
+            return
+        delay = max(min_delay, self._last_flush + (1.0 / self._rate if self._rate > 0 else 0.0) - time.monotonic())
+        self._flush_handle = True  # scheduled
+        self._loop.call_soon_threadsafe(self._call_later, delay)
+
+    def _call_later(self, delay: float) -> None:
+        with self._lock:
+            if self._flush_handle is True:
+                self._flush_handle = self._loop.call_later(delay, self._flush)
+
+    def _flush(self) -> None:
+        """Write a batch of pending events to the transport
+        """
+        with self._lock:
+            self._flush_handle = None
+            if self._closed or not self._pending:
+                return
+            self._last_flush = time.monotonic()
+            # backpressure: keep the events pending (and apply the policy) until the client catches up,
+            # retrying with a minimum delay to not spin the event loop (e.g. when there is no rate limit)
+            if self._transport.get_write_buffer_size() > self._max_buffer_size:
+                self._schedule_flush(min_delay=BACKPRESSURE_DELAY)
+                return
+            events = self._pending[:self._max_batch]
+            self._pending = self._pending[self._max_batch:]
+            batch = {"stream": self._stream, "events": events, "dropped": self._dropped}
+            self._seen = len(self._pending)
+            self._dropped = 0
+            if self._pending:
+                self._schedule_flush()
+        if self._transport.is_closing():
+            self.close()
+            return
+        self._transport.write((json.dumps(batch, default=str) + "\n").encode())
@@ -1,6 +1,8 @@
 import __future__
+from typing import List, Optional, Tuple
 
 import os
+import ast
 import sys
 import jedi
 import json
@@ -9,8 +11,6 @@ import socket
 import asyncio
 import traceback
 import subprocess
-import contextlib
-from io import StringIO
 from dis import COMPILER_FLAG_NAMES
 try:
     from ast import PyCF_ALLOW_TOP_LEVEL_AWAIT
@@ -20,6 +20,21 @@ except ImportError:
 import carb
 import omni.ext
 
+from . import output_capture
+from .output_capture import OutputCapture
+from .event_bridge import EventSubscription
+from .namespace_inspector import NamespaceInspector, format_size
+from .background_jobs import BackgroundJob, BackgroundJobManager
+from .completion import CompletionRanker
+
+# helpers exposed in the execution namespace (see Extension._globals). usd_bulk is injected in on_startup
+from .background_jobs import report_progress
+
+# maximum number of completions for which the signature is computed (metadata)
+COMPLETION_SIGNATURES_LIMIT = 20
+# minimum interval (in seconds) between the progress updates pushed for a background job
+JOB_UPDATE_INTERVAL = 0.1
+
 
 def _get_coroutine_flag() -> int:
     """Get the coroutine flag for the current Python version
@@ -52,6 +67,30 @@ def _get_compiler_flags() -> int:
     flags = flags | PyCF_ALLOW_TOP_LEVEL_AWAIT
     return flags
 
+def _compile_statement(statement: str):
+    """Compile the statement trying 'eval' mode first (to get the value of expressions) and 'exec' mode otherwise
+    """
+    try:
+        return compile(statement, "<string>", "eval", flags= _get_compiler_flags(), dont_inherit=True)
+    except SyntaxError:
+        return compile(statement, "<string>", "exec", flags= _get_compiler_flags(), dont_inherit=True)
+
+def _compile_cell(source: str) -> tuple:
+    """Compile a (multi-statement) cell as its statements ('exec' mode) and its trailing expression ('eval' mode)
+
+    :return: compiled statements and trailing expression (None if missing)
+    :rtype: tuple
+    """
+    tree = ast.parse(source)
+    expression = None
+    if tree.body and isinstance(tree.body[-1], ast.Expr):
+        expression = ast.Expression(tree.body.pop().value)
+        expression = compile(expression, "<string>", "eval", flags= _get_compiler_flags(), dont_inherit=True)
+    statements = None
+    if tree.body:
+        statements = compile(tree, "<string>", "exec", flags= _get_compiler_flags(), dont_inherit=True)
+    return statements, expression
+
 def _get_event_loop() -> asyncio.AbstractEventLoop:
     """Backward compatible function for getting the event loop
     """
@@ -76,6 +115,10 @@ class Extension(omni.ext.IExt):
 
         self._server = None
         self._process = None
+        self._event_subscriptions = set()
+
+        # capture the output of each execution (task) without swapping the streams per execution
+        output_capture.install()
 
         self._settings = carb.settings.get_settings()
         self._extension_path = omni.kit.app.get_app().get_extension_manager().get_extension_path(ext_id)
@@ -90,7 +133,24 @@ class Extension(omni.ext.IExt):
         self._classic_notebook_interface = self._settings.get("/exts/semu.misc.jupyter_notebook/classic_notebook_interface")
 
         self._socket_port = self._settings.get("/exts/semu.misc.jupyter_notebook/socket_port")
+        background_max_concurrency = self._settings.get("/exts/semu.misc.jupyter_notebook/background_max_concurrency")
         kill_processes_with_port_in_use = self._settings.get("/exts/semu.misc.jupyter_notebook/kill_processes_with_port_in_use")
+        self._completion_max_results = self._settings.get("/exts/semu.misc.jupyter_notebook/completion_max_results")
+        self._completion_metadata = self._settings.get("/exts/semu.misc.jupyter_notebook/completion_metadata")
+        self._completion_ranker = CompletionRanker()
+
+        # background jobs (%%background) and namespace inspection (the extension's globals are not variables)
+        self._background_jobs = BackgroundJobManager(max_concurrency=background_max_concurrency)
+        self._globals["background_jobs"] = self._background_jobs
+
+        # USD helpers (omni.usd is not a dependency of this extension, so it is imported only when available)
+        try:
+            from . import usd_bulk
+            self._globals["usd_bulk"] = usd_bulk
+        except ImportError as e:
+            carb.log_warn(f"USD bulk helpers (usd_bulk) are not available: {e}")
+
+        self._namespace_inspector = NamespaceInspector(self._globals)
 
         # menu item
         self._editor_menu = omni.kit.ui.get_editor_menu()
@@ -189,6 +249,13 @@ class Extension(omni.ext.IExt):
         if self._menu is not None:
             self._editor_menu.remove_item(self._menu)
             self._menu = None
+        # cancel the background jobs and restore the output streams
+        self._background_jobs.cancel_all()
+        output_capture.uninstall()
+        # unsubscribe from the event streams forwarded to the notebooks
+        for subscription in list(self._event_subscriptions):
+            subscription.close()
+        self._event_subscriptions.clear()
         # close the socket
         if self._server:
             self._server.close()
@@ -261,16 +328,46 @@ class Extension(omni.ext.IExt):
             def __init__(self, parent) -> None:
                 super().__init__()
                 self._parent = parent
+                self._subscription = None
+                self._stream_buffer = None
+                self._execution = None
 
             def connection_made(self, transport):
                 peername = transport.get_extra_info('peername')
                 carb.log_info('Connection from {}'.format(peername))
                 self.transport = transport
 
+            def connection_lost(self, exc):
+                # unsubscribe from the event stream when the kernel disconnects
+                if self._subscription is not None:
+                    self._parent._unsubscribe_events(self._subscription)
+                    self._subscription = None
+                # cancel the running execution when the kernel disconnects (e.g. it was shut down after a timeout).
+                # Synchronous code cannot be cancelled, but it blocks the event loop until it returns
+                if self._execution is not None and not self._execution.done():
+                    carb.log_warn("Kernel disconnected during an execution. Cancelling the execution")
+                    self._execution.cancel()
+
             def data_received(self, data):
+                # event stream subscription: "%!s" + newline-delimited options (subscription, then updates)
+                if self._stream_buffer is not None or data[:3] == b"%!s":
+                    self._stream_received(data)
+                    return
                 code = data.decode()
+                # variable inspection
+                if code[:3] == "%!v":
+                    code = code[3:]
+                    asyncio.run_coroutine_threadsafe(self._parent._inspect_namespace_async(code, self.transport), _get_event_loop())
+                # magic commands
+                elif code[:3] == "%!m":
+                    code = code[3:]
+                    asyncio.run_coroutine_threadsafe(self._parent._exec_magic_async(code, self.transport), _get_event_loop())
+                # background job updates
+                elif code[:3] == "%!j":
+                    code = code[3:]
+                    asyncio.run_coroutine_threadsafe(self._watch_job_async(code, self.transport), _get_event_loop())
                 # completion
-                if code[:3] == "%!c":
+                elif code[:3] == "%!c":
                     code = code[3:]
                     asyncio.run_coroutine_threadsafe(self._parent._complete_code_async(code, self.transport), _get_event_loop())
                 # introspection
@@ -282,7 +379,21 @@ class Extension(omni.ext.IExt):
                     asyncio.run_coroutine_threadsafe(self._parent._introspect_code_async(code, line, column, self.transport), _get_event_loop())
                 # execution
                 else:
-                    asyncio.run_coroutine_threadsafe(self._parent._exec_code_async(code, self.transport), _get_event_loop())
+                    self._execution = asyncio.run_coroutine_threadsafe(self._parent._exec_code_async(code, self.transport), _get_event_loop())
+
+            def _stream_received(self, data):
+                # buffer the received bytes and only handle complete lines
+                self._stream_buffer = (self._stream_buffer or b"") + data
+                while b"\n" in self._stream_buffer:
+                    line, self._stream_buffer = self._stream_buffer.split(b"\n", 1)
+                    line = line.decode()
+                    if line.startswith("%!s"):
+                        if self._subscription is None:
+                            self._subscription = self._parent._subscribe_events(line[3:], self.transport)
+                            if self._subscription is None:
+                                return
+                    elif self._subscription is not None and line.strip():
+                        self._parent._configure_events(self._subscription, line, self.transport)
 
         async def server_task():
             self._server = await _get_event_loop().create_server(protocol_factory=lambda: ServerProtocol(self), 
@@ -299,6 +410,52 @@ class Extension(omni.ext.IExt):
         with open(socket_txt, "w") as f:
             f.write(str(self._socket_port))
 
+    def _subscribe_events(self, options: str, transport: asyncio.Transport) -> Optional[EventSubscription]:
+        """Subscribe to a Kit event stream and forward its events to the IPython kernel
+
+        :param options: JSON-encoded subscription options (see EventSubscription)
+        :type options: str
+        :param transport: transport to send the event batches to the IPython kernel
+        :type transport: asyncio.Transport
+
+        :return: event subscription or None if the subscription failed
+        :rtype: EventSubscription or None
+        """
+        try:
+            subscription = EventSubscription(transport, _get_event_loop(), **json.loads(options))
+        except Exception as e:
+            carb.log_warn(f"Event stream subscription failed: {e}")
+            transport.write((json.dumps({"error": f"{type(e).__name__}: {e}"}) + "\n").encode())
+            transport.close()
+            return None
+        self._event_subscriptions.add(subscription)
+        return subscription
+
+    def _configure_events(self, subscription: EventSubscription, options: str, transport: asyncio.Transport) -> None:
+        """Update the options of an event stream subscription
+
+        :param subscription: event subscription
+        :type subscription: EventSubscription
+        :param options: JSON-encoded subscription options (see EventSubscription)
+        :type options: str
+        :param transport: transport to send the error (if any) to the IPython kernel
+        :type transport: asyncio.Transport
+        """
+        try:
+            subscription.configure(**json.loads(options))
+        except Exception as e:
+            carb.log_warn(f"Event stream configuration failed: {e}")
+            transport.write((json.dumps({"error": f"{type(e).__name__}: {e}"}) + "\n").encode())
+
+    def _unsubscribe_events(self, subscription: EventSubscription) -> None:
+        """Unsubscribe from a Kit event stream
+
+        :param subscription: event subscription
+        :type subscription: EventSubscription
+        """
+        subscription.close()
+        self._event_subscriptions.discard(subscription)
+
     async def _complete_code_async(self, statement: str, transport: asyncio.Transport) -> None:
         """Complete objects under the cursor and send the result to the IPython kernel
         
@@ -310,12 +467,35 @@ class Extension(omni.ext.IExt):
         :return: reply dictionary
         :rtype: dict
         """
-        # generate completions
+        # generate completions (fuzzy matching)
         script = jedi.Script(statement, project=self._jedi_project)
-        completions = script.complete()
+        completions = script.complete(fuzzy=True)
         delta = completions[0].get_completion_prefix_length() if completions else 0
 
-        reply = {"matches": [c.name for c in completions], "delta": delta}
+        # rank completions and keep the top ones (user variables are boosted only when completing bare names)
+        prefix = statement[len(statement) - delta:]
+        is_attribute = statement[:len(statement) - delta].rstrip().endswith(".")
+        variables = set() if is_attribute else set(self._namespace_inspector.variable_names())
+        completions, more_available = self._completion_ranker.rank(completions, 
+                                                                   prefix=prefix, 
+                                                                   variables=variables, 
+                                                                   limit=self._completion_max_results)
+
+        reply = {"matches": [c.name for c in completions], "delta": delta, "more_available": more_available}
+
+        # add type and signature of the completions (the statement ends at the cursor position)
+        if self._completion_metadata:
+            types = []
+            for i, c in enumerate(completions):
+                item = {"start": len(statement) - delta, "end": len(statement), "text": c.name, "type": c.type}
+                if i < COMPLETION_SIGNATURES_LIMIT and c.type in ["function", "class"]:
+                    try:
+                        signatures = c.get_signatures()
+                        item["signature"] = signatures[0].to_string() if signatures else ""
+                    except Exception:
+                        pass
+                types.append(item)
+            reply["metadata"] = {"_jupyter_types_experimental": types}
 
         # send the reply to the IPython kernel
         reply = json.dumps(reply)
@@ -366,22 +546,13 @@ class Extension(omni.ext.IExt):
         :return: reply dictionary
         :rtype: dict
         """
-        _stdout = StringIO()
+        self._completion_ranker.record_usage(statement)
+
+        capture = OutputCapture()
         try:
-            with contextlib.redirect_stdout(_stdout):
-                should_exec_code = True
-                # try 'eval' first
-                try:
-                    code = compile(statement, "<string>", "eval", flags= _get_compiler_flags(), dont_inherit=True)
-                except SyntaxError:
-                    pass
-                else:
-                    result = eval(code, self._globals, self._locals)
-                    should_exec_code = False
-                # if 'eval' fails, try 'exec'
-                if should_exec_code:
-                    code = compile(statement, "<string>", "exec", flags= _get_compiler_flags(), dont_inherit=True)
-                    result = eval(code, self._globals, self._locals)
+            with capture:
+                code = _compile_statement(statement)
+                result = eval(code, self._globals, self._locals)
                 # await the result if it is a coroutine
                 if _has_coroutine_flag(code):
                     result = await result
@@ -400,8 +571,14 @@ class Extension(omni.ext.IExt):
         else:
             reply = {"status": "ok"}
 
-        # add output to reply dictionary for printing
-        reply["output"] = _stdout.getvalue()
+        # add output (stdout, and stderr and carb log messages) to reply dictionary for printing
+        reply["output"] = capture.stdout.getvalue()
+        reply["stderr"] = capture.stderr.getvalue()
+
+        # add namespace changes to reply dictionary for the variable explorer
+        variables = self._namespace_inspector.diff()
+        if variables is not None:
+            reply["variables"] = variables
 
         # send the reply to the IPython kernel
         reply = json.dumps(reply)
@@ -410,6 +587,163 @@ class Extension(omni.ext.IExt):
         # close the connection
         transport.close()
 
+    async def _inspect_namespace_async(self, request: str, transport: asyncio.Transport) -> None:
+        """Inspect the execution namespace variables and send the result to the IPython kernel
+
+        :param request: JSON-encoded request: {"action": "list"} or {"action": "size", "names": list of str}
+        :type request: str
+        :param transport: transport to send the result to the IPython kernel
+        :type transport: asyncio.Transport
+
+        :return: reply dictionary
+        :rtype: dict
+        """
+        request = json.loads(request)
+        action = request.get("action", "list")
+        if action == "list":
+            reply = self._namespace_inspector.list_variables()
+        elif action == "size":
+            reply = {"sizes": self._namespace_inspector.deep_sizes(request.get("names", []))}
+        else:
+            reply = {"error": f"Unsupported action '{action}'"}
+        reply["action"] = action
+
+        # send the reply to the IPython kernel
+        reply = json.dumps(reply)
+        transport.write(reply.encode())
+
+        # close the connection
+        transport.close()
+
+    async def _exec_magic_async(self, statement: str, transport: asyncio.Transport) -> None:
+        """Execute a magic command in the Omniverse scope and send the result to the IPython kernel
+
+        Supported magic commands:
+
+        - ``%reset``: delete all the variables of the execution namespace
+        - ``%del NAME [NAME ...]``: delete the given variables of the execution namespace
+        - ``%%background [NAME]``: run the cell as a background job and assign its handle to NAME (if given)
+        - ``%jobs``: list the background jobs
+
+        :param statement: magic command line (and cell body for cell magic commands)
+        :type statement: str
+        :param transport: transport to send the result to the IPython kernel
+        :type transport: asyncio.Transport
+
+        :return: reply dictionary
+        :rtype: dict
+        """
+        line, _, body = statement.partition("\n")
+        magic, *args = line.split()
+        job = None
+        try:
+            if magic in ["%reset", "%del"]:
+                output = self._magic_reset(magic, args)
+            elif magic == "%%background":
+                output, job = self._magic_background(args, body)
+            elif magic == "%jobs":
+                output = self._magic_jobs()
+            else:
+                raise ValueError(f"Unknown magic command {magic}")
+        except Exception as e:
+            reply = {"status": "error",
+                     "traceback": [f"{type(e).__name__}: {e}"],
+                     "ename": str(type(e).__name__),
+                     "evalue": str(e),
+                     "output": ""}
+        else:
+            reply = {"status": "ok", "output": output}
+            # the IPython kernel watches the job to display its progress
+            if job is not None:
+                reply["job"] = job.as_dict()
+
+        # add namespace changes to reply dictionary for the variable explorer
+        variables = self._namespace_inspector.diff()
+        if variables is not None:
+            reply["variables"] = variables
+
+        # send the reply to the IPython kernel
+        reply = json.dumps(reply)
+        transport.write(reply.encode())
+
+        # close the connection
+        transport.close()
+
+    def _magic_reset(self, magic: str, args: List[str]) -> str:
+        """Delete variables from the execution namespace (%reset, %del) and report the memory freed
+        """
+        names = [arg for arg in args if not arg.startswith("-")]  # e.g. %reset -f
+        if magic == "%del" and not names:
+            raise ValueError("Usage: %del NAME [NAME ...]")
+        report = self._namespace_inspector.delete(None if magic == "%reset" else names)
+        output = [f"Deleted {len(report['deleted'])} variable(s): {', '.join(report['deleted'])}"]
+        if report["missing"]:
+            output.append(f"Not defined: {', '.join(report['missing'])}")
+        output.append(f"Estimated size: {format_size(report['estimated'])}")
+        if report["rss_before"] is not None and report["rss_after"] is not None:
+            output.append(f"RSS: {format_size(report['rss_before'])} -> {format_size(report['rss_after'])} "
+                          f"(freed {format_size(report['rss_before'] - report['rss_after'])})")
+        return "\n".join(output) + "\n"
+
+    def _magic_background(self, args: List[str], body: str) -> Tuple[str, BackgroundJob]:
+        """Schedule the cell body as a background job (%%background) and return immediately
+        """
+        if len(args) > 1 or (args and not args[0].isidentifier()):
+            raise ValueError("Usage: %%background [NAME]")
+        if not body.strip():
+            raise ValueError("The cell body is empty")
+        statements, expression = _compile_cell(body)
+
+        async def run():
+            # the job result is the value of the cell's trailing expression, if any
+            result = None
+            for code in [statements, expression]:
+                if code is not None:
+                    result = eval(code, self._globals, self._locals)
+                    if _has_coroutine_flag(code):
+                        result = await result
+            return result
+
+        name = args[0] if args else ""
+        job = self._background_jobs.submit(run, name=name)
+        if name:
+            self._globals[name] = job
+            return f"Background job {job.id} started (handle: {name})\n", job
+        return f"Background job {job.id} started (handle: background_jobs.get({job.id}))\n", job
+
+    async def _watch_job_async(self, job_id: str, transport: asyncio.Transport) -> None:
+        """Push the updates (status and progress) of a background job to the IPython kernel until the job finishes
+
+        Updates are written as newline-delimited JSON (see BackgroundJob.as_dict), at most every JOB_UPDATE_INTERVAL seconds
+
+        :param job_id: job identifier
+        :type job_id: str
+        :param transport: transport to send the updates to the IPython kernel
+        :type transport: asyncio.Transport
+        """
+        job = self._background_jobs.get(int(job_id)) if job_id.strip().isdigit() else None
+        if job is None:
+            transport.write((json.dumps({"error": f"Unknown background job {job_id}"}) + "\n").encode())
+            transport.close()
+            return
+        while not transport.is_closing():
+            # wait for the next update only after sending the current state, without missing any update in between
+            update = job.add_waiter()
+            transport.write((json.dumps(job.as_dict(), default=str) + "\n").encode())
+            if job.done():
+                break
+            await update
+            await asyncio.sleep(JOB_UPDATE_INTERVAL)
+        transport.close()
+
+    def _magic_jobs(self) -> str:
+        """List the background jobs (%jobs)
+        """
+        jobs = self._background_jobs.jobs
+        if not jobs:
+            return "No background jobs\n"
+        return "\n".join([repr(job) for job in jobs]) + "\n"
+
     # launch Jupyter Notebook methods
 
     def _launch_jupyter_process(self) -> None:
@@ -0,0 +1,244 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import gc
+import os
+import sys
+import types
+import reprlib
+import collections
+
+
+# objects that are shared (code, types, modules) and are not accounted for in the deep size
+_SHARED_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+
+_repr = reprlib.Repr()
+_repr.maxstring = 80
+_repr.maxother = 80
+
+
+def get_rss() -> Optional[int]:
+    """Get the resident set size (RSS) of the current process in bytes
+
+    :return: RSS or None if it cannot be determined
+    :rtype: int or None
+    """
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    if sys.platform == "linux":
+        try:
+            with open("/proc/self/statm", "r") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError):
+            pass
+    return None
+
+def format_size(size: Optional[int]) -> str:
+    """Format a size in bytes as a human-readable string
+    """
+    if size is None:
+        return "n/a"
+    value = float(abs(size))
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if value < 1024 or unit == "GiB":
+            break
+        value /= 1024
+    return "{}{:.1f} {}".format("-" if size < 0 else "", value, unit)
+
+def deep_size(obj: Any, max_objects: int = 1000000) -> int:
+    """Estimate the memory (in bytes) held by an object and the objects it references
+
+    Modules, types and functions are not traversed. Numpy arrays account for their data buffer once, even when shared
+    between views. Memory owned by C++ objects (e.g. USD stages) is not accounted for
+
+    :param obj: object
+    :type obj: Any
+    :param max_objects: maximum number of objects to traverse (default: 1000000)
+    :type max_objects: int, optional
+
+    :return: estimated size
+    :rtype: int
+    """
+    size = 0
+    seen = set()
+    stack = [obj]
+    while stack and len(seen) < max_objects:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, _SHARED_TYPES):
+            continue
+        seen.add(id(o))
+        try:
+            size += sys.getsizeof(o)
+        except TypeError:
+            continue
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset, collections.deque)):
+            stack.extend(o)
+        elif type(o).__module__ == "numpy" and getattr(o, "base", None) is not None:
+            stack.append(o.base)
+        else:
+            if hasattr(o, "__dict__"):
+                stack.append(o.__dict__)
+            for slot in getattr(type(o), "__slots__", ()):
+                if isinstance(slot, str) and hasattr(o, slot):
+                    stack.append(getattr(o, slot))
+    return size
+
+def _fingerprint(value: Any) -> Tuple:
+    """Cheap fingerprint of a value used to detect in-place changes (e.g. growing lists, dicts or arrays)
+
+    Changes that keep the fingerprint (e.g. assigning an element of a list or an array) are not detected
+    """
+    try:
+        size = sys.getsizeof(value)
+    except TypeError:
+        size = None
+    if hasattr(value, "shape") and hasattr(value, "nbytes"):
+        try:
+            return (id(value), size, tuple(value.shape), int(value.nbytes))
+        except Exception:
+            pass
+    if isinstance(value, (list, tuple, dict, set, frozenset, collections.deque, str, bytes, bytearray)):
+        return (id(value), size, len(value))
+    return (id(value), size)
+
+
+class NamespaceInspector:
+    def __init__(self, namespace: dict) -> None:
+        """Inspect and reclaim the variables of an execution namespace
+
+        Names defined when the inspector is created (e.g. the extension's own globals) are not considered variables,
+        unless they are rebound. Private names (starting with "_") and modules are also ignored.
+        Variables are reported as changed when they are rebound or their fingerprint (size, length, shape) changes
+
+        :param namespace: execution namespace
+        :type namespace: dict
+        """
+        self._namespace = namespace
+        self._baseline = {name: id(value) for name, value in namespace.items()}
+        self._snapshot = self._take_snapshot()
+        self._deep_sizes = {}
+        self.version = 0
+
+    def _is_variable(self, name: str, value: Any) -> bool:
+        return not name.startswith("_") \
+            and not isinstance(value, types.ModuleType) \
+            and self._baseline.get(name) != id(value)
+
+    def _take_snapshot(self) -> Dict[str, Tuple]:
+        return {name: _fingerprint(value) for name, value in list(self._namespace.items()) \
+            if self._is_variable(name, value)}
+
+    def _describe(self, name: str) -> dict:
+        """Describe a variable (cheap information only, the deep size is computed on demand)
+        """
+        value = self._namespace[name]
+        entry = {"name": name,
+                 "type": "{}.{}".format(type(value).__module__, type(value).__qualname__),
+                 "size": sys.getsizeof(value) if not isinstance(value, _SHARED_TYPES) else 0}
+        try:
+            entry["summary"] = _repr.repr(value)
+        except Exception:
+            entry["summary"] = "<{}>".format(type(value).__name__)
+        if hasattr(value, "shape") and hasattr(value, "dtype"):
+            entry["shape"] = [int(i) for i in value.shape]
+            entry["dtype"] = str(value.dtype)
+        if type(value).__module__.startswith("pxr."):
+            entry["usd"] = True
+        cached = self._deep_sizes.get(name)
+        if cached is not None and cached[0] == id(value):
+            entry["deep_size"] = cached[1]
+        return entry
+
+    def variable_names(self) -> List[str]:
+        """Get the names of the variables of the namespace (without describing them)
+        """
+        return [name for name, value in list(self._namespace.items()) if self._is_variable(name, value)]
+
+    def list_variables(self) -> dict:
+        """List the variables of the namespace
+
+        Pending changes are listed but not consumed (they are still reported by the next ``diff``),
+        so the returned version is the one the next diff is based on
+
+        :return: {"version": int, "variables": list of dict}
+        :rtype: dict
+        """
+        return {"version": self.version, "variables": [self._describe(name) for name in sorted(self._take_snapshot())]}
+
+    def diff(self) -> Optional[dict]:
+        """Get the changes in the namespace since the previous call (incrementing the version)
+
+        :return: {"version": int, "base": int, "changed": list of dict, "removed": list of str}
+                 or None if nothing changed
+        :rtype: dict or None
+        """
+        snapshot = self._take_snapshot()
+        changed = [name for name, fingerprint in snapshot.items() if self._snapshot.get(name) != fingerprint]
+        removed = [name for name in self._snapshot if name not in snapshot]
+        self._snapshot = snapshot
+        for name in changed + removed:
+            self._deep_sizes.pop(name, None)
+        if not changed and not removed:
+            return None
+        self.version += 1
+        return {"version": self.version,
+                "base": self.version - 1,
+                "changed": [self._describe(name) for name in sorted(changed)],
+                "removed": sorted(removed)}
+
+    def deep_sizes(self, names: List[str]) -> Dict[str, int]:
+        """Compute (or get the cached) deep size of the given variables
+
+        Deep sizes are cached until the variable changes (it is rebound or its fingerprint changes).
+        In-place changes that keep the fingerprint (e.g. assigning an element of a list) are not detected
+
+        :param names: variable names
+        :type names: list of str
+
+        :return: deep size of each existing variable
+        :rtype: dict
+        """
+        sizes = {}
+        for name in names:
+            if name not in self._namespace:
+                continue
+            value = self._namespace[name]
+            cached = self._deep_sizes.get(name)
+            if cached is None or cached[0] != id(value):
+                cached = (id(value), deep_size(value))
+                self._deep_sizes[name] = cached
+            sizes[name] = cached[1]
+        return sizes
+
+    def delete(self, names: Optional[List[str]] = None) -> dict:
+        """Delete variables from the namespace and collect garbage
+
+        :param names: variable names. If None, all the variables are deleted (default: None)
+        :type names: list of str, optional
+
+        :return: {"deleted": list of str, "missing": list of str, "estimated": int, "rss_before": int, "rss_after": int}
+        :rtype: dict
+        """
+        if names is None:
+            names = sorted(self._take_snapshot())
+        deleted = [name for name in names if name in self._namespace]
+        missing = [name for name in names if name not in self._namespace]
+        estimated = sum(self.deep_sizes(deleted).values())
+
+        rss_before = get_rss()
+        for name in deleted:
+            del self._namespace[name]
+            self._deep_sizes.pop(name, None)
+        gc.collect()
+        rss_after = get_rss()
+
+        return {"deleted": deleted,
+                "missing": missing,
+                "estimated": estimated,
+                "rss_before": rss_before,
+                "rss_after": rss_after}
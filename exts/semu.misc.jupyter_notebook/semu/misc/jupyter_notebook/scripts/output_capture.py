@@ -0,0 +1,110 @@
+from typing import Any, Optional
+
+import sys
+import contextvars
+from io import StringIO
+
+import carb
+import carb.logging
+
+
+# capture of the running execution (each asyncio task has its own context)
+_capture = contextvars.ContextVar("semu.misc.jupyter_notebook.capture", default=None)
+
+_LOG_LEVELS = {carb.logging.LEVEL_VERBOSE: "Verbose",
+               carb.logging.LEVEL_INFO: "Info",
+               carb.logging.LEVEL_WARN: "Warning",
+               carb.logging.LEVEL_ERROR: "Error",
+               carb.logging.LEVEL_FATAL: "Fatal"}
+
+# carb logger (see install)
+_logger = None
+
+
+class OutputCapture:
+    def __init__(self) -> None:
+        """Capture the stdout, stderr and carb log messages produced within the current context (execution task)
+
+        Output produced outside the context (e.g. by Kit itself or by other executions) is not captured.
+        Output produced once the capture has exited (e.g. by tasks spawned during the execution)
+        is written to the original streams
+        """
+        self.stdout = StringIO()
+        self.stderr = StringIO()
+        self.closed = False
+        self._token = None
+
+    def __enter__(self) -> "OutputCapture":
+        self._token = _capture.set(self)
+        return self
+
+    def __exit__(self, *args) -> None:
+        _capture.reset(self._token)
+        self.closed = True
+
+
+def _get_capture() -> Optional[OutputCapture]:
+    """Get the active capture of the current context
+    """
+    capture = _capture.get()
+    return None if capture is None or capture.closed else capture
+
+
+class _StreamProxy:
+    def __init__(self, stream: Any, name: str) -> None:
+        """Stream that writes to the active capture of the current context or to the original stream otherwise
+        """
+        self._stream = stream
+        self._name = name
+
+    def write(self, s: str) -> int:
+        capture = _get_capture()
+        if capture is None:
+            return self._stream.write(s)
+        return getattr(capture, self._name).write(s)
+
+    def writelines(self, lines) -> None:
+        for line in lines:
+            self.write(line)
+
+    def flush(self) -> None:
+        if _get_capture() is None:
+            self._stream.flush()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._stream, name)
+
+
+def _on_log(source: str, level: int, filename: str, line_number: int, message: str) -> None:
+    """carb logger callback that copies the message to the active capture of the current context
+
+    The callback is called in the thread that logs, so only messages logged while an execution is running
+    in that thread (from Python or C++) are captured. Messages filtered out by carb's log level are not received
+    """
+    capture = _get_capture()
+    if capture is not None:
+        capture.stderr.write(f"[{_LOG_LEVELS.get(level, level)}] [{source}] {message}\n")
+
+
+def install() -> None:
+    """Install the context-aware stdout/stderr proxies and the carb logger (once for the whole process)
+    """
+    global _logger
+    if not isinstance(sys.stdout, _StreamProxy):
+        sys.stdout = _StreamProxy(sys.stdout, "stdout")
+    if not isinstance(sys.stderr, _StreamProxy):
+        sys.stderr = _StreamProxy(sys.stderr, "stderr")
+    if _logger is None:
+        _logger = carb.logging.acquire_logging().add_logger(_on_log)
+
+def uninstall() -> None:
+    """Restore the original streams and remove the carb logger
+    """
+    global _logger
+    if isinstance(sys.stdout, _StreamProxy):
+        sys.stdout = sys.stdout._stream
+    if isinstance(sys.stderr, _StreamProxy):
+        sys.stderr = sys.stderr._stream
+    if _logger is not None:
+        carb.logging.acquire_logging().remove_logger(_logger)
+        _logger = None
@@ -0,0 +1,259 @@
+from typing import Any, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+import omni.usd
+from pxr import Sdf, Usd, UsdGeom, Vt
+
+
+__all__ = ["get_attribute_values",
+           "set_attribute_values",
+           "get_world_transforms",
+           "set_world_transforms",
+           "get_world_poses"]
+
+
+def _get_stage(stage: Optional[Usd.Stage]) -> Usd.Stage:
+    """Get the given stage or the current stage of the USD context
+    """
+    return stage if stage is not None else omni.usd.get_context().get_stage()
+
+def _get_time(time: Union[Usd.TimeCode, float, None]) -> Usd.TimeCode:
+    """Get the time code (default time code if None)
+    """
+    if time is None:
+        return Usd.TimeCode.Default()
+    return time if isinstance(time, Usd.TimeCode) else Usd.TimeCode(time)
+
+def _get_paths(prims: Iterable[Union[str, Sdf.Path, Usd.Prim]]) -> List[Sdf.Path]:
+    """Convert prims, paths or path strings to a list of paths
+    """
+    return [prim.GetPath() if isinstance(prim, Usd.Prim) else Sdf.Path(prim) for prim in prims]
+
+def _get_array_type(type_name: Sdf.ValueTypeName) -> Any:
+    """Get the Vt array class for the given (scalar) value type name (e.g. Vt.Vec3fArray for float3)
+    """
+    return type_name.arrayType.type.pythonClass
+
+def _to_vt_array(array_type: Any, values: Any) -> Any:
+    """Convert values (numpy array or sequence) to a Vt array of the given type
+    """
+    if isinstance(values, np.ndarray) and hasattr(array_type, "FromNumpy"):
+        return array_type.FromNumpy(values)
+    if isinstance(values, np.ndarray):
+        values = values.tolist()
+    return array_type(values)
+
+def _author_values(stage: Usd.Stage,
+                   paths: List[Sdf.Path],
+                   name: str,
+                   type_name: Sdf.ValueTypeName,
+                   values: Iterable,
+                   time: Usd.TimeCode,
+                   variability: Sdf.Variability = Sdf.VariabilityVarying) -> None:
+    """Author attribute values in the current edit target using the Sdf API in a single change block
+
+    Paths are mapped through the edit target (e.g. into a variant), like ``Usd.Attribute.Set`` does
+
+    :raises ValueError: if a path cannot be mapped to the edit target
+    """
+    edit_target = stage.GetEditTarget()
+    layer = edit_target.GetLayer()
+    with Sdf.ChangeBlock():
+        for path, value in zip(paths, values):
+            spec_path = edit_target.MapToSpecPath(path)
+            if spec_path.isEmpty:
+                raise ValueError(f"Prim {path} cannot be mapped to the current edit target")
+            spec = layer.GetAttributeAtPath(spec_path.AppendProperty(name))
+            if spec is None:
+                spec = Sdf.AttributeSpec(Sdf.CreatePrimInLayer(layer, spec_path), name, type_name, variability)
+            if time.IsDefault():
+                spec.default = value
+            else:
+                layer.SetTimeSample(spec.path, time.GetValue(), value)
+
+def get_attribute_values(prims: Iterable[Union[str, Sdf.Path, Usd.Prim]],
+                         name: str,
+                         time: Union[Usd.TimeCode, float, None] = None,
+                         stage: Optional[Usd.Stage] = None) -> Union[np.ndarray, List[np.ndarray]]:
+    """Read the value of an attribute for a set of prims
+
+    Values are still read prim by prim (USD has no batched attribute read API), so the gain over a Python loop
+    is limited to resolving each attribute with a single ``GetAttributeAtPath`` call, packing the values
+    into a Vt array converted to numpy without per-element copies, and a single socket round trip per call
+
+    :param prims: prims, paths or path strings
+    :type prims: iterable
+    :param name: attribute name (e.g. "radius", "xformOp:translate")
+    :type name: str
+    :param time: time code to read at (default: None, the default time code)
+    :type time: Usd.TimeCode or float, optional
+    :param stage: USD stage (default: None, the current stage)
+    :type stage: Usd.Stage, optional
+
+    :raises ValueError: if the attribute is not defined or has no value for any of the prims
+
+    :return: stacked values with shape (number of prims, *value shape) or,
+             for array-valued attributes (e.g. "points"), a list of arrays
+    :rtype: np.ndarray or list of np.ndarray
+    """
+    stage = _get_stage(stage)
+    time = _get_time(time)
+    paths = _get_paths(prims)
+    if not paths:
+        return np.empty((0,))
+
+    attributes = [stage.GetAttributeAtPath(path.AppendProperty(name)) for path in paths]
+    values = [attribute.Get(time) if attribute else None for attribute in attributes]
+    for path, value in zip(paths, values):
+        if value is None:
+            raise ValueError(f"Attribute '{name}' has no value for prim {path}")
+
+    type_name = attributes[0].GetTypeName()
+    if type_name.isArray:
+        return [np.array(value) for value in values]
+    return np.array(_to_vt_array(_get_array_type(type_name), values))
+
+def set_attribute_values(prims: Iterable[Union[str, Sdf.Path, Usd.Prim]],
+                         name: str,
+                         values: Any,
+                         time: Union[Usd.TimeCode, float, None] = None,
+                         type_name: Optional[Sdf.ValueTypeName] = None,
+                         stage: Optional[Usd.Stage] = None) -> None:
+    """Write the value of an attribute for a set of prims
+
+    Values are authored in the current edit target layer using the Sdf API inside a single ``Sdf.ChangeBlock``,
+    so that the change notification is sent only once for the whole set
+
+    :param prims: prims, paths or path strings
+    :type prims: iterable
+    :param name: attribute name (e.g. "radius", "xformOp:translate")
+    :type name: str
+    :param values: values with shape (number of prims, *value shape)
+    :type values: np.ndarray or sequence
+    :param time: time code to write at (default: None, the default time code)
+    :type time: Usd.TimeCode or float, optional
+    :param type_name: attribute type, required if the attribute does not exist on the first prim (default: None).
+                      Missing attribute specs are created with the type and variability of the first prim's attribute
+                      (varying if it does not exist)
+    :type type_name: Sdf.ValueTypeName, optional
+    :param stage: USD stage (default: None, the current stage)
+    :type stage: Usd.Stage, optional
+
+    :raises ValueError: if the number of values does not match the number of prims or the type cannot be resolved
+    """
+    stage = _get_stage(stage)
+    time = _get_time(time)
+    paths = _get_paths(prims)
+    if len(values) != len(paths):
+        raise ValueError(f"Number of values ({len(values)}) does not match the number of prims ({len(paths)})")
+    if not paths:
+        return
+
+    variability = Sdf.VariabilityVarying
+    attribute = stage.GetAttributeAtPath(paths[0].AppendProperty(name))
+    if attribute:
+        variability = attribute.GetVariability()
+        if type_name is None:
+            type_name = attribute.GetTypeName()
+    elif type_name is None:
+        raise ValueError(f"Attribute '{name}' is not defined for prim {paths[0]}. Specify its type_name")
+
+    if type_name.isArray:
+        values = [_to_vt_array(type_name.type.pythonClass, value) for value in values]
+    else:
+        values = _to_vt_array(_get_array_type(type_name), values)
+    _author_values(stage, paths, name, type_name, values, time, variability)
+
+def get_world_transforms(prims: Iterable[Union[str, Sdf.Path, Usd.Prim]],
+                         time: Union[Usd.TimeCode, float, None] = None,
+                         stage: Optional[Usd.Stage] = None) -> np.ndarray:
+    """Compute the world-space (local to world) transforms for a set of prims
+
+    Transforms are computed using a single ``UsdGeom.XformCache``, so that the ancestors' transforms are shared
+
+    :param prims: prims, paths or path strings
+    :type prims: iterable
+    :param time: time code to compute at (default: None, the default time code)
+    :type time: Usd.TimeCode or float, optional
+    :param stage: USD stage (default: None, the current stage)
+    :type stage: Usd.Stage, optional
+
+    :return: transforms with shape (number of prims, 4, 4) using the USD (row-vector) convention
+    :rtype: np.ndarray
+    """
+    stage = _get_stage(stage)
+    cache = UsdGeom.XformCache(_get_time(time))
+    matrices = [cache.GetLocalToWorldTransform(stage.GetPrimAtPath(path)) for path in _get_paths(prims)]
+    return np.array(Vt.Matrix4dArray(matrices)).reshape(-1, 4, 4)
+
+def set_world_transforms(prims: Iterable[Union[str, Sdf.Path, Usd.Prim]],
+                         transforms: np.ndarray,
+                         time: Union[Usd.TimeCode, float, None] = None,
+                         stage: Optional[Usd.Stage] = None) -> None:
+    """Set the world-space (local to world) transforms for a set of prims
+
+    The local transforms are authored as a single ``xformOp:transform`` operation (the ``xformOpOrder`` is replaced)
+
+    :param prims: prims, paths or path strings
+    :type prims: iterable
+    :param transforms: transforms with shape (number of prims, 4, 4) using the USD (row-vector) convention
+    :type transforms: np.ndarray
+    :param time: time code to write at (default: None, the default time code)
+    :type time: Usd.TimeCode or float, optional
+    :param stage: USD stage (default: None, the current stage)
+    :type stage: Usd.Stage, optional
+
+    :raises ValueError: if the number of transforms does not match the number of prims
+    """
+    stage = _get_stage(stage)
+    time = _get_time(time)
+    paths = _get_paths(prims)
+    transforms = np.asarray(transforms, dtype=np.float64).reshape(-1, 4, 4)
+    if len(transforms) != len(paths):
+        raise ValueError(f"Number of transforms ({len(transforms)}) does not match the number of prims ({len(paths)})")
+    if not paths:
+        return
+
+    # local = world * inverse(parent to world)
+    cache = UsdGeom.XformCache(time)
+    parents = [cache.GetParentToWorldTransform(stage.GetPrimAtPath(path)) for path in paths]
+    parents = np.array(Vt.Matrix4dArray(parents)).reshape(-1, 4, 4)
+    local_transforms = np.matmul(transforms, np.linalg.inv(parents))
+
+    _author_values(stage, paths, "xformOp:transform", Sdf.ValueTypeNames.Matrix4d,
+                   _to_vt_array(Vt.Matrix4dArray, local_transforms), time)
+    order = Vt.TokenArray(["xformOp:transform"])
+    _author_values(stage, paths, "xformOpOrder", Sdf.ValueTypeNames.TokenArray,
+                   [order] * len(paths), Usd.TimeCode.Default(), Sdf.VariabilityUniform)
+
+def get_world_poses(prims: Iterable[Union[str, Sdf.Path, Usd.Prim]],
+                    time: Union[Usd.TimeCode, float, None] = None,
+                    stage: Optional[Usd.Stage] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Compute the world-space positions and orientations for a set of prims
+
+    :param prims: prims, paths or path strings
+    :type prims: iterable
+    :param time: time code to compute at (default: None, the default time code)
+    :type time: Usd.TimeCode or float, optional
+    :param stage: USD stage (default: None, the current stage)
+    :type stage: Usd.Stage, optional
+
+    :return: positions with shape (number of prims, 3) and
+             orientations as quaternions (w, x, y, z) with shape (number of prims, 4)
+    :rtype: tuple of np.ndarray
+    """
+    transforms = get_world_transforms(prims, time, stage)
+    positions = transforms[:, 3, :3].copy()
+
+    # remove the scale (rows are the scaled axes in the row-vector convention) and transpose to column-vector convention
+    rotations = transforms[:, :3, :3] / np.linalg.norm(transforms[:, :3, :3], axis=2, keepdims=True)
+    r = np.transpose(rotations, (0, 2, 1))
+    w = 0.5 * np.sqrt(np.maximum(0, 1 + r[:, 0, 0] + r[:, 1, 1] + r[:, 2, 2]))
+    x = 0.5 * np.sqrt(np.maximum(0, 1 + r[:, 0, 0] - r[:, 1, 1] - r[:, 2, 2]))
+    y = 0.5 * np.sqrt(np.maximum(0, 1 - r[:, 0, 0] + r[:, 1, 1] - r[:, 2, 2]))
+    z = 0.5 * np.sqrt(np.maximum(0, 1 - r[:, 0, 0] - r[:, 1, 1] + r[:, 2, 2]))
+    x = np.copysign(x, r[:, 2, 1] - r[:, 1, 2])
+    y = np.copysign(y, r[:, 0, 2] - r[:, 2, 0])
+    z = np.copysign(z, r[:, 1, 0] - r[:, 0, 1])
+    return positions, np.stack([w, x, y, z], axis=1)